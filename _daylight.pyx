@@ -0,0 +1,44 @@
+# cython: boundscheck=False, wraparound=False, cdivision=True
+"""Скомпилированное ядро calculate_daylight_hours.
+
+Сборка (необязательна, скрипт работает и без неё):
+    pip install cython && cythonize -i _daylight.pyx
+
+sincos() из libm считает синус и косинус одного угла за один вызов,
+цикл по дням распараллелен через prange.
+"""
+from cython.parallel import prange
+from libc.math cimport M_PI, acos, sin
+
+cdef extern from "math.h" nogil:
+    void sincos(double x, double *sin_x, double *cos_x)
+
+
+def daylight_array(double[::1] days, double latitude, double[::1] out):
+    """Заполняет out продолжительностью дня (часы) для массива дней года"""
+    cdef Py_ssize_t i, n = days.shape[0]
+    cdef double lat_rad = latitude * M_PI / 180.0
+    cdef double sin_lat = 0.0, cos_lat = 0.0
+    sincos(lat_rad, &sin_lat, &cos_lat)
+    cdef double sin_refr = sin(0.8333 * M_PI / 180.0)
+    cdef double beta, s, c, dec_rad, sin_dec, cos_dec, cos_h
+    for i in prange(n, nogil=True):
+        beta = (days[i] - 1) * (360.0 / 365.0) * (M_PI / 180.0)
+        s = 0.0
+        c = 0.0
+        sincos(beta, &s, &c)
+        # Формула Спенсера: без множителя 180/pi результат сразу в радианах
+        dec_rad = (0.006918
+                   - 0.399912 * c + 0.070257 * s
+                   - 0.006758 * (c * c - s * s) + 0.00907 * (2 * s * c)
+                   - 0.002697 * (c * (4 * c * c - 3)) + 0.00148 * (s * (3 - 4 * s * s)))
+        sin_dec = 0.0
+        cos_dec = 0.0
+        sincos(dec_rad, &sin_dec, &cos_dec)
+        cos_h = (-sin_lat * sin_dec - sin_refr) / (cos_lat * cos_dec)
+        if cos_h >= 1:
+            out[i] = 0.0  # Полярная ночь
+        elif cos_h <= -1:
+            out[i] = 24.0  # Полярный день
+        else:
+            out[i] = 2.0 * (acos(cos_h) * 180.0 / M_PI) / 15.0
@@ -1,75 +1,222 @@
 import calendar
+import functools
+import math
+
 import cv2
 from datetime import datetime, timedelta, timezone
 
 import matplotlib.dates as mdates
 import matplotlib.pyplot as plt
+import numexpr as ne
 import numpy as np
 
+try:
+    from numba import float64, njit, vectorize
+except ImportError:  # numba не обязателен: без него работает путь numpy/numexpr
+    vectorize = None
+
+try:
+    import _daylight  # собирается из _daylight.pyx: cythonize -i _daylight.pyx
+except ImportError:  # расширение не собрано — работаем через numba или numpy
+    _daylight = None
+
+try:
+    import cupy
+except ImportError:  # cupy нужен только для backend='cupy' (расчёт на GPU)
+    cupy = None
+
 
 TZ = timezone(timedelta(hours=3))
 
 
 def float_hours_to_hm(hours_float: float | np.float32) -> str:
-    td = timedelta(hours=hours_float)
-    total_seconds = int(td.total_seconds())
-    hours = total_seconds // 3600
-    minutes = (total_seconds % 3600) // 60
-    return f"{hours:02d}:{minutes:02d}"
+    total_minutes = int(round(hours_float * 60))
+    return f"{total_minutes // 60:02d}:{total_minutes % 60:02d}"
 
 
-def get_declination_spencer(day_of_year: int) -> float:
+def get_declination_spencer(day_of_year):
     """Формула Спенсера"""
     beta = np.radians(360 * (day_of_year - 1) / 365)
+    # sin/cos кратных углов через тождества: 2 трансцендентных вызова вместо 6
+    s = np.sin(beta)
+    c = np.cos(beta)
+    s2 = 2 * s * c
+    c2 = c * c - s * s
+    s3 = s * (3 - 4 * s * s)
+    c3 = c * (4 * c * c - 3)
     return (180 / np.pi) * (
             0.006918
-            - 0.399912 * np.cos(beta) + 0.070257 * np.sin(beta)
-            - 0.006758 * np.cos(2 * beta) + 0.00907 * np.sin(2 * beta)
-            - 0.002697 * np.cos(3 * beta) + 0.00148 * np.sin(3 * beta)
+            - 0.399912 * c + 0.070257 * s
+            - 0.006758 * c2 + 0.00907 * s2
+            - 0.002697 * c3 + 0.00148 * s3
     )
 
 
-def get_declination_kuper(day_of_year: int) -> float:
+def get_declination_kuper(day_of_year):
     """Формула Купера"""
     return 23.45 * np.sin(np.radians(360 * (284 + day_of_year) / 365))
 
 
-def calculate_daylight_hours(day_of_year: int, latitude: float) -> float:
-    # Расчёт склонения
-    declination = get_declination_spencer(day_of_year)
+# Склонение — гладкая периодическая функция дня года: считаем формулу Спенсера
+# один раз для целых дней, дробные дни берём линейной интерполяцией по таблице
+_DEC_DAYS = np.arange(1, 367, dtype=np.float64)
+_DEC_LUT = get_declination_spencer(_DEC_DAYS)
+
+
+def calculate_daylight_hours(day_of_year, latitude, xp=np):
+    """Продолжительность дня: принимает скалярный день или массив дней, возвращает часы.
+
+    xp=cupy переносит расчёт на GPU; широту можно передать массивом (M, 1),
+    тогда broadcasting даёт сразу матрицу часов (широта, день)."""
+    if np.isscalar(day_of_year) and np.ndim(latitude) == 0 and xp is np:
+        # Скалярный быстрый путь: math на порядок быстрее скалярных ufunc numpy
+        day = min(max(float(day_of_year), 1.0), 366.0)
+        j = min(int(day), 365)
+        frac = day - j
+        declination = _DEC_LUT[j - 1] * (1 - frac) + _DEC_LUT[j] * frac
+        lat_rad = math.radians(latitude)
+        dec_rad = math.radians(declination)
+        cos_h = ((-math.sin(lat_rad) * math.sin(dec_rad) - math.sin(math.radians(0.8333)))
+                 / (math.cos(lat_rad) * math.cos(dec_rad)))
+        if cos_h >= 1:
+            return 0.0  # Полярная ночь
+        if cos_h <= -1:
+            return 24.0  # Полярный день
+        return 2 * math.degrees(math.acos(cos_h)) / 15.0
+
+    day = xp.asarray(day_of_year, dtype=xp.float64)
+
+    # Расчёт склонения (интерполяция по предвычисленной таблице)
+    declination = xp.interp(day, xp.asarray(_DEC_DAYS), xp.asarray(_DEC_LUT))
 
     # Преобразуем в радианы
-    lat_rad = np.radians(latitude)
-    dec_rad = np.radians(declination)
+    dec_rad = xp.radians(declination)
 
     # Учет атмосферной рефракции (стандартная поправка -0.83°)
     # Для практических расчетов часто используют -0.8333°
-    refraction_correction = np.radians(0.8333)
+    refraction_correction = math.radians(0.8333)
+    sin_refr = math.sin(refraction_correction)
+
+    # Величины, не зависящие от дня года, считаем один раз вне массивного выражения
+    if np.ndim(latitude) == 0:
+        lat_rad = math.radians(latitude)
+        sin_lat = math.sin(lat_rad)
+        cos_lat = math.cos(lat_rad)
+    else:
+        lat_rad = xp.radians(xp.asarray(latitude, dtype=xp.float64))
+        sin_lat = xp.sin(lat_rad)
+        cos_lat = xp.cos(lat_rad)
+
+    # Вычисляем часовой угол с учетом рефракции: классическая форма уравнения
+    # восхода — одно деление вместо произведения тангенсов плюс деления
+    if xp is np:
+        # numexpr вычисляет всё выражение за один проход по памяти, без временных массивов
+        cos_h = ne.evaluate(
+            "(-sin_lat * sin(dec_rad) - sin_refr) / (cos_lat * cos(dec_rad))",
+            local_dict={'sin_lat': sin_lat, 'dec_rad': dec_rad, 'sin_refr': sin_refr, 'cos_lat': cos_lat},
+        )
+    else:
+        cos_h = (-sin_lat * xp.sin(dec_rad) - sin_refr) / (cos_lat * xp.cos(dec_rad))
+
+    # Полярная ночь / полярный день без ветвлений
+    polar_night = cos_h >= 1
+    polar_day = cos_h <= -1
+
+    if xp is np:
+        # cos_h — свежий буфер из numexpr, доводим его до часов на месте через out=
+        np.clip(cos_h, -1.0, 1.0, out=cos_h)
+        np.arccos(cos_h, out=cos_h)
+        np.degrees(cos_h, out=cos_h)
+        np.multiply(cos_h, 2.0 / 15.0, out=cos_h)
+        cos_h[polar_night] = 0.0
+        cos_h[polar_day] = 24.0
+        daylight = cos_h
+    else:
+        # Ограничиваем значение
+        cos_h = xp.clip(cos_h, -1.0, 1.0)
 
-    # Защита от нулей
-    test_cos = np.cos(lat_rad) * np.cos(dec_rad)
-    if abs(test_cos) < 1e-10:
-        return 24.0 if np.sin(lat_rad) * np.sin(dec_rad) > 0 else 0.0
+        # Продолжительность дня в часах
+        h = xp.degrees(xp.arccos(cos_h))
+        daylight = xp.where(polar_night, 0.0, xp.where(polar_day, 24.0, 2 * h / 15.0))
 
-    # Вычисляем часовой угол с учетом рефракции
-    cos_h = -np.tan(lat_rad) * np.tan(dec_rad) - np.sin(refraction_correction) / (np.cos(lat_rad) * np.cos(dec_rad))
+    return daylight
 
-    if cos_h >= 1:
-        return 0.0  # Полярная ночь
-    if cos_h <= -1:
-        return 24.0  # Полярный день
 
-    # Ограничиваем значение
-    cos_h = np.clip(cos_h, -1.0, 1.0)
+if vectorize is not None:
+    @vectorize([float64(float64, float64)], nopython=True, target='parallel')
+    def _daylight_kernel(day_of_year, latitude):
+        """Скомпилированное скалярное ядро calculate_daylight_hours (numba)"""
+        beta = math.radians(360 * (day_of_year - 1) / 365)
+        declination = (180 / math.pi) * (
+                0.006918
+                - 0.399912 * math.cos(beta) + 0.070257 * math.sin(beta)
+                - 0.006758 * math.cos(2 * beta) + 0.00907 * math.sin(2 * beta)
+                - 0.002697 * math.cos(3 * beta) + 0.00148 * math.sin(3 * beta)
+        )
+        lat_rad = math.radians(latitude)
+        dec_rad = math.radians(declination)
+        cos_h = ((-math.sin(lat_rad) * math.sin(dec_rad) - math.sin(math.radians(0.8333)))
+                 / (math.cos(lat_rad) * math.cos(dec_rad)))
+        if cos_h >= 1:
+            return 0.0  # Полярная ночь
+        if cos_h <= -1:
+            return 24.0  # Полярный день
+        return 2 * math.degrees(math.acos(cos_h)) / 15.0
+else:
+    _daylight_kernel = None
+
+
+if vectorize is not None:
+    @njit(cache=True)
+    def _min_mean_max(a):
+        """Минимум, среднее и максимум за один проход по массиву"""
+        mn = a[0]
+        mx = a[0]
+        s = 0.0
+        for x in a:
+            if x < mn:
+                mn = x
+            if x > mx:
+                mx = x
+            s += x
+        return mn, s / len(a), mx
+else:
+    def _min_mean_max(a):
+        return np.min(a), np.mean(a), np.max(a)
+
+
+@functools.lru_cache(maxsize=256)
+def _daylight_curve(year: int, latitude_milli: int, freq: int, backend: str = 'numpy'):
+    """Кэшируемая кривая (dates_ticks, daylight_hours) года для широты в миллиградусах"""
+    days_in_year = 366 if calendar.isleap(year) else 365
+    latitude = latitude_milli / 1000
+
+    days = np.arange(1, days_in_year + 1, 1.0 / freq, dtype=np.float64)
+    if backend == 'cupy':
+        if cupy is None:
+            raise ImportError("backend='cupy' требует установленный cupy")
+        daylight_hours = cupy.asnumpy(calculate_daylight_hours(days, latitude, xp=cupy))
+    elif _daylight is not None:
+        daylight_hours = np.empty(len(days), dtype=np.float64)
+        _daylight.daylight_array(days, float(latitude), daylight_hours)
+    elif _daylight_kernel is not None:
+        daylight_hours = _daylight_kernel(days, np.float64(latitude))
+    else:
+        daylight_hours = calculate_daylight_hours(days, latitude)
 
-    # Продолжительность дня в часах
-    h = np.degrees(np.arccos(cos_h))
-    daylight = 2 * h / 15.0
+    # Даты для оси X: один массив datetime64 вместо тысяч объектов datetime
+    start_date = np.datetime64(f'{year}-01-01')
+    step_seconds = int(86400 / freq)
+    dates_ticks = start_date + np.arange(days_in_year * freq, dtype='int64') * np.timedelta64(step_seconds, 's')
 
-    return daylight
+    # Кэшируемые массивы делаем только для чтения
+    dates_ticks.setflags(write=False)
+    daylight_hours.setflags(write=False)
+    return dates_ticks, daylight_hours
 
 
-def plot_daylight_duration(latitude, year=None, show_solstices=True, plot_today=True, plot_derivative=False, city_name=''):
+def plot_daylight_duration(latitude, year=None, show_solstices=True, plot_today=True, plot_derivative=False,
+                           city_name='', backend='numpy'):
     """
     Строит график продолжительности светового дня в течение года.
 
@@ -77,27 +224,28 @@ def plot_daylight_duration(latitude, year=None, show_solstices=True, plot_today=
     latitude (float): географическая широта в градусах
     year (int): год для отображения дат (по умолчанию текущий)
     show_solstices (bool): показывать ли солнцестояния и равноденствия
+    backend (str): 'numpy' (по умолчанию) или 'cupy' — расчёт кривой на GPU
     """
 
     # Создаем график
     fig, ax = plt.subplots(figsize=(12, 6))
 
-    # Устанавливаем год
+    # Устанавливаем год (один снимок времени, чтобы дата не «уехала» между вызовами)
+    now = datetime.now(tz=TZ)
     if year is None:
-        year = datetime.now(tz=TZ).year
+        year = now.year
 
     # Проверяем високосный ли год
     days_in_year = 366 if calendar.isleap(year) else 365
 
     # Создаем массивы данных
 
-    freq = 30  # Points per day
+    # Points per day: плотнее, чем пикселей фигуры на один день, сетка не нужна
+    fig_width_px = fig.get_size_inches()[0] * fig.dpi
+    freq = max(4, round(fig_width_px / days_in_year))
 
-    days = list(np.arange(1, days_in_year + 1, 1 / freq))
-    daylight_hours = np.array([calculate_daylight_hours(day, latitude) for day in days])
-
-    # Создаем даты для оси X
-    dates_ticks = [datetime(year, 1, 1) + timedelta(seconds=int(86400 * day - 86400)) for day in days]
+    # Повторные вызовы для той же широты и года берут кривую из кэша
+    dates_ticks, daylight_hours = _daylight_curve(year, int(round(latitude * 1000)), freq, backend)
 
     # Рисуем основной график
     ax.plot(dates_ticks, daylight_hours, 'b-', linewidth=2, label='Длина дня')
@@ -108,7 +256,9 @@ def plot_daylight_duration(latitude, year=None, show_solstices=True, plot_today=
         ax2 = ax.twinx()
         ax.set_zorder(ax2.get_zorder() + 1)
         ax.patch.set_visible(False)
-        daylight_derivative = np.gradient(daylight_hours, edge_order=1) * 60
+        # Шаг сетки 1/freq дня: градиент сразу в часах/день, домножаем до минут/день на месте
+        daylight_derivative = np.gradient(daylight_hours, 1.0 / freq, edge_order=1)
+        np.multiply(daylight_derivative, 60.0, out=daylight_derivative)
         ax2.plot(dates_ticks, daylight_derivative, 'g-', linewidth=2, label='Изменение')
         y_diff = np.max([np.abs(np.max(daylight_derivative)), np.abs(np.min(daylight_derivative))])
         y_min, y_max = -y_diff, y_diff
@@ -116,7 +266,7 @@ def plot_daylight_duration(latitude, year=None, show_solstices=True, plot_today=
         ax2.set_yticks(np.arange(y_min, y_max + 0.00000000001, y_diff / 5))
         # ax2.set_yticks([])
         ax2.spines['right'].set_color('green')
-        ax2.set_ylabel('Изменение (минуты)', fontsize=12, color='green')
+        ax2.set_ylabel('Изменение (минуты/день)', fontsize=12, color='green')
         ax2.tick_params(axis='y', colors='green', right=False)
 
     # Настройки графика
@@ -146,39 +296,41 @@ def plot_daylight_duration(latitude, year=None, show_solstices=True, plot_today=
             'Зимнее солнцестояние': datetime(year, 12, 21)
         }
         if plot_today:
-            events['Сегодня'] = datetime(year, datetime.now(tz=TZ).month, datetime.now(tz=TZ).day)
+            events['Сегодня'] = datetime(year, now.month, now.day)
 
-        for event_name, event_date in events.items():
-            # Находим ближайший день в массиве
-            idx = min(range(len(dates_ticks)), key=lambda i: abs((dates_ticks[i] - event_date).days))
-            hours = float(daylight_hours[idx])
-            # hours_str = f'{int(hours)}:{int((hours - int(hours)) * 60)}'
-            hours_str = float_hours_to_hm(hours)
+        # Индексы и часы всех событий одним векторным шагом:
+        # сетка дней равномерная, поэтому ближайший индекс считается арифметически
+        event_dates = np.array(list(events.values()), dtype='datetime64[D]')
+        idxs = np.minimum((event_dates - np.datetime64(f'{year}-01-01')).astype(np.int64) * freq,
+                          len(daylight_hours) - 1)
+        event_hours = daylight_hours[idxs]
+
+        colors = ['red' if name == 'Сегодня' else 'blue' for name in events]
+        styles = ['-' if name == 'Сегодня' else '--' for name in events]
 
-            # Добавляем вертикальную линию и текст
+        # Одна коллекция линий и один scatter вместо пяти пар axvline+plot
+        ax.vlines(event_dates, 0, 24, colors=colors, linestyles=styles, alpha=0.5)
+        ax.scatter(event_dates, event_hours, c=colors, s=64, zorder=3)
+
+        for (event_name, event_date), hours in zip(events.items(), event_hours):
+            hours = float(hours)
+            hours_str = float_hours_to_hm(hours)
             if event_name == 'Сегодня':
                 event_name = 'Сегодня\n' + datetime.strftime(event_date, '%d.%m.%Y')
-                color = 'red'
-                dot_color = 'ro'
-                line_style = '-'
                 y_cor = hours + 0.5
             else:
-                color = 'blue'
-                dot_color = 'bo'
-                line_style = '--'
                 y_cor = 1
 
-            ax.axvline(event_date, color=color, linestyle=line_style, alpha=0.5) # noqa
-            ax.plot(event_date, hours, dot_color, markersize=8) # noqa
             ax.text(event_date, y_cor, f'{event_name}\n{hours_str}', # noqa
                     ha='center', fontsize=9, bbox=dict(boxstyle="round,pad=0.3", facecolor="white", alpha=0.8))
 
     # Добавляем статистику в легенду
+    mn, avg, mx = _min_mean_max(daylight_hours)
     stats_text = (f'{city_name}'
                   f'Широта: {latitude}°\n'
-                  f'Min: {float_hours_to_hm(np.min(daylight_hours))}\n'
-                  f'Avg: {float_hours_to_hm(np.mean(daylight_hours))}\n'
-                  f'Max: {float_hours_to_hm(np.max(daylight_hours))}')
+                  f'Min: {float_hours_to_hm(mn)}\n'
+                  f'Avg: {float_hours_to_hm(avg)}\n'
+                  f'Max: {float_hours_to_hm(mx)}')
     ax.text(0.99, 0.98, stats_text, transform=ax.transAxes, fontsize=10,
             horizontalalignment='right', verticalalignment='top', bbox=dict(boxstyle="round,pad=0.3", facecolor="white", alpha=0.8))
 